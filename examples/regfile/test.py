@@ -4,10 +4,14 @@
 # This code is licensed under Apache License 2.0 (see LICENSE for details)
 
 import numpy as np
+from pathlib import Path
 from switchboard import SbDut, UmiTxRx
 from umi import sumi
 
 
+THIS_DIR = Path(__file__).resolve().parent
+
+
 def main():
     # build the simulator
     dut = build_testbench()
@@ -61,7 +65,7 @@ def build_testbench(fast=False):
 
     # Set up inputs
     dut.use(sumi)
-    dut.input('testbench.sv')
+    dut.input(str(THIS_DIR / 'testbench.sv'))
 
     # Verilator configuration
     dut.add('tool', 'verilator', 'task', 'compile', 'warningoff',
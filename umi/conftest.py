@@ -25,6 +25,15 @@ def test_wrapper(tmp_path):
 
 def pytest_addoption(parser):
     parser.addoption("--seed", type=int, action="store", help="Provide a fixed seed")
+    parser.addoption("--sim-profile", action="store_true",
+                     help="Build LUMI simulators with Verilator profiling and debug enabled")
+    parser.addoption("--sim-trace", action="store_true", help="Dump waveforms during simulation")
+    parser.addoption("--sim-threads", type=int, action="store", default=1,
+                     help="Number of Verilator threads for LUMI simulators")
+    parser.addoption("--sim-cpus", type=str, action="store",
+                     help="Comma separated list of CPUs to pin LUMI simulators to")
+    parser.addoption("--sim-hier", action="store_true",
+                     help="Verilate LUMI instances as hierarchical blocks")
 
 
 @pytest.fixture
@@ -37,3 +46,8 @@ def random_seed(request):
     print(f'Random seed used: {test_seed}')
     yield test_seed
     print(f'Random seed used: {test_seed}')
+
+
+@pytest.fixture
+def sim_trace(request):
+    return request.config.getoption("--sim-trace")
@@ -1,7 +1,68 @@
+import os
+import shutil
+import hashlib
+import importlib.metadata
+import importlib.util
 import pytest
-from switchboard import SbDut
+from pathlib import Path
+from switchboard import SbDut, UmiTxRx, delete_queue
+import umi
 from umi import lumi
 from fasteners import InterProcessLock
+from lumi_util import configure_verilator, verilator_threads
+
+
+# Sources the lumi simulator is built from, resolved once at import
+LUMI_SOURCES = [str(path)
+                for src in ('lumi/rtl', 'lumi/testbench', 'sumi/rtl', 'utils/rtl')
+                for path in sorted((Path(umi.__file__).parent / src).resolve().rglob('*'))
+                if path.is_file()]
+
+
+# Packages whose Verilog, C++ or build flow end up in the lumi simulator
+LUMI_DEPENDENCIES = (('lambdalib', 'lambdalib'),
+                     ('switchboard', 'switchboard-hw'),
+                     ('siliconcompiler', 'siliconcompiler'))
+
+
+def build_key(dut, *options):
+    '''
+    Returns a short digest of the lumi sources, the Verilator compile options
+    and config files configured on dut, the versions and locations of the
+    packages listed in LUMI_DEPENDENCIES, and any extra options. Local edits
+    to an installed dependency are not tracked; set UMI_REBUILD=1 to force a
+    rebuild in that case.
+    '''
+
+    h = hashlib.blake2b(digest_size=8)
+    for path in LUMI_SOURCES:
+        h.update(path.encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    for module, dist in LUMI_DEPENDENCIES:
+        h.update(module.encode())
+        h.update(importlib.metadata.version(dist).encode())
+        h.update(importlib.util.find_spec(module).origin.encode())
+    h.update(repr(dut.get('tool', 'verilator', 'task', 'compile', 'option')).encode())
+    h.update(repr(dut.get('tool', 'verilator', 'task', 'compile', 'file', 'config')).encode())
+    h.update(repr(options).encode())
+    return h.hexdigest()
+
+
+def prune_builds(build_dir, keep):
+    '''
+    Removes lumi simulators built for other sources or options. Only one key is
+    in use per session, so older builds would otherwise pile up in the pytest
+    cache. pytest --cache-clear removes all of them.
+    '''
+
+    for path in build_dir.glob(f'{lumi.__name__}-*'):
+        if path.name.startswith(f'{keep}.') or path.name == keep:
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
 
 
 def pytest_collection_modifyitems(items):
@@ -17,9 +78,12 @@ def build_dir(pytestconfig):
 
 
 @pytest.fixture
-def lumi_dut(build_dir, request):
+def lumi_dut(build_dir, sim_trace, request):
 
-    dut = SbDut('testbench', default_main=True, trace=False)
+    threads = request.config.getoption('--sim-threads')
+
+    dut = SbDut('testbench', default_main=True, trace=sim_trace,
+                threads=verilator_threads(threads))
 
     # dut = SbDut('testbench', cmdline=True,
     #             default_main=True, trace=True, trace_type='vcd')
@@ -33,18 +97,57 @@ def lumi_dut(build_dir, request):
     dut.set('tool', 'verilator', 'task', 'compile', 'file', 'config', 'lumi/testbench/config.vlt',
             package='umi')
 
-    # Build simulator
-    dut.set('option', 'builddir', build_dir / lumi.__name__)
-    with InterProcessLock(build_dir / f'{lumi.__name__}.lock'):
+    configure_verilator(dut,
+                        profile=request.config.getoption('--sim-profile'),
+                        hier=request.config.getoption('--sim-hier'))
+
+    # Build simulator, reusing a previous build of the same sources and options.
+    # The key is computed after all options above are configured; trace and
+    # threads are applied by SbDut itself at build time.
+    build_name = f'{lumi.__name__}-{build_key(dut, sim_trace, threads)}'
+    dut.set('option', 'builddir', build_dir / build_name)
+    with InterProcessLock(build_dir / f'{build_name}.lock'):
         # ensure build only happens once
         # https://github.com/pytest-dev/pytest-xdist/blob/v3.6.1/docs/how-to.rst#making-session-scoped-fixtures-execute-only-once
-        dut.build(fast=True)
+        # The marker records the test run that last set up this build, shared by
+        # all xdist workers, so UMI_REBUILD=1 forces one rebuild per run rather
+        # than one per test.
+        marker = build_dir / f'{build_name}.run'
+        run_id = os.environ.get('PYTEST_XDIST_TESTRUNUID', str(os.getpid()))
+        first_use = not marker.exists() or marker.read_text() != run_id
+        if first_use:
+            prune_builds(build_dir, keep=build_name)
+        dut.build(fast=not (first_use and os.environ.get('UMI_REBUILD') == '1'))
+        marker.write_text(run_id)
 
     yield dut
 
     dut.terminate()
 
 
+@pytest.fixture
+def sim_cpus(request):
+    cpus = request.config.getoption('--sim-cpus')
+    if cpus:
+        return {int(cpu) for cpu in cpus.split(',')}
+    return None
+
+
+@pytest.fixture
+def lumi_queues():
+    queues = ("sb2dut_0.q", "dut2sb_0.q", "host2dut_0.q", "dut2host_0.q")
+
+    # instantiate TX and RX queues once, before the simulation is launched, and
+    # hand the same handles to every phase of the test
+    sb = UmiTxRx(queues[0], queues[1], fresh=True)
+    host = UmiTxRx(queues[2], queues[3], fresh=True)
+
+    yield sb, host
+
+    for q in queues:
+        delete_queue(q)
+
+
 @pytest.fixture(params=("2d", "3d"))
 def chip_topo(request):
     return request.param
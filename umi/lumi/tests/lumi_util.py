@@ -0,0 +1,148 @@
+# Helpers shared by the LUMI testbenches
+# Copyright (C) 2026 Zero ASIC
+# This code is licensed under Apache License 2.0 (see LICENSE for details)
+
+import os
+import time
+import numpy as np
+from contextlib import contextmanager
+
+
+@contextmanager
+def pinned(cpus):
+    # processes launched inside the block (i.e. the simulator) inherit the CPU
+    # affinity; the calling Python driver gets its own affinity back on exit
+    if not cpus:
+        yield
+        return
+
+    affinity = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, affinity)
+
+
+def verilator_threads(threads):
+    # SbDut only adds --threads when given a count, so single threaded builds pass None
+    return threads if threads > 1 else None
+
+
+def configure_verilator(dut, profile=False, hier=False):
+    # Profiling inflates runtime and VL_DEBUG disables inlining, so only add them on request
+    if profile:
+        dut.add('tool', 'verilator', 'task', 'compile', 'option',
+                ['--prof-cfuncs', '-CFLAGS', '-DVL_DEBUG', '-CFLAGS', '-pg', '-LDFLAGS', '-pg'])
+    else:
+        dut.add('tool', 'verilator', 'task', 'compile', 'option', ['-CFLAGS', '-O3'])
+
+    # Split the generated C++ so it compiles in parallel
+    dut.add('tool', 'verilator', 'task', 'compile', 'option',
+            ['--output-split', '20000', '--output-split-cfuncs', '500'])
+
+    # The testbenches are driven by switchboard clock ticks and have no delays
+    # under Verilator, so the timing runtime is not needed
+    dut.add('tool', 'verilator', 'task', 'compile', 'option', '--no-timing')
+
+    if hier:
+        dut.add('tool', 'verilator', 'task', 'compile', 'file', 'config', 'lumi/testbench/hier.vlt',
+                package='umi')
+        dut.add('tool', 'verilator', 'task', 'compile', 'option', '--hierarchical')
+
+
+def posted_writes(txrx, pairs):
+    # issue the posted register writes back to back; the next read acts as the fence
+    for addr, value in pairs:
+        txrx.write(addr, np.uint32(value), posted=True)
+
+
+def link_setup(sb, topo, crdt=None):
+    # Lumi starts in auto configuration based on the link indication from the phy
+    # In 2d mode no need to configure anything!
+    # In 3d mode need to take down the link and re-enable it with the right configuration
+    print("### Side Band loc reset ###")
+    sb.write(0x7000000C, np.uint32(0x00000000), posted=True)
+
+    # Need to add some delay are reassertion before sending things
+    # over serial link
+    print("### Read local reset ###")
+    val32 = sb.read(0x70000000, np.uint32)
+    print(f"Read: 0x{val32:08x}")
+    assert val32 == 0x00000000
+
+    if topo == '3d':
+        width = 0x00030000
+
+        linkactive = 0
+        while (linkactive == 0):
+            print("### Wait for linkactive ###")
+            linkactive = sb.read(0x70000004, np.uint32)
+            print(f"Read: 0x{linkactive:08x}")
+
+        linkactive = 0
+        while (linkactive == 0):
+            print("### Wait for linkactive ###")
+            linkactive = sb.read(0x60000004, np.uint32)
+            print(f"Read: 0x{linkactive:08x}")
+
+        print("### disable Tx ###")
+        posted_writes(sb, [
+            (0x60000010, 0x0),
+            (0x70000010, 0x0)
+        ])
+
+        time.sleep(0.1)
+
+        # Tx credits are only initialized when requested
+        init_crdt = [] if crdt is None else [(0x60000020, crdt), (0x70000020, crdt)]
+
+        print("### disable Rx, configure width, enable Rx/Tx/credit ###")
+        posted_writes(sb, [
+            # disable Rx
+            (0x70000014, 0x0),
+            (0x60000014, 0x0),
+            # configure loc/rmt Rx width
+            (0x70000010, width),
+            (0x60000010, width),
+            # configure loc/rmt Tx width
+            (0x70000014, width),
+            (0x60000014, width)
+        ] + init_crdt + [
+            # Rx enable local/remote
+            (0x70000014, 0x1 + width),
+            (0x60000014, 0x1 + width),
+            # Tx enable remote/local
+            (0x60000010, 0x1 + width),
+            (0x70000010, 0x1 + width),
+            # Tx enable credit
+            (0x60000010, 0x11 + width),
+            (0x70000010, 0x11 + width)
+        ])
+
+    print("### Read loc Rx ctrl ###")
+    val32 = sb.read(0x70000014, np.uint32)
+    print(f"Read: 0x{val32:08x}")
+
+    print("### Read loc Tx ctrl ###")
+    val32 = sb.read(0x70000010, np.uint32)
+    print(f"Read: 0x{val32:08x}")
+
+    print("### Read rmt Rx ctrl ###")
+    val32 = sb.read(0x60000014, np.uint32)
+    print(f"Read: 0x{val32:08x}")
+
+    print("### Read rmt Tx ctrl ###")
+    val32 = sb.read(0x60000010, np.uint32)
+    print(f"Read: 0x{val32:08x}")
+
+
+def credit_status(sb, log=print):
+    for side, base in (("loc", 0x70000000), ("rmt", 0x60000000)):
+        for offset, desc in ((0x30, "req credit unavailable"),
+                             (0x34, "resp credit unavailable"),
+                             (0x38, "req credit available"),
+                             (0x3C, "resp credit available")):
+            log(f"### Read {side} Tx {desc} ###")
+            val32 = sb.read(base + offset, np.uint32)
+            log(f"Read: 0x{val32:08x}")
@@ -3,10 +3,12 @@
 # Copyright (C) 2025 Zero ASIC
 # This code is licensed under Apache License 2.0 (see LICENSE for details)
 
+import argparse
 import multiprocessing
 import numpy as np
 from switchboard import SbDut, UmiTxRx, UmiCmd, random_umi_packet, umi_loopback
 from umi import lumi
+from lumi_util import configure_verilator, verilator_threads
 
 
 def gen_mergeable_umi_packets(num_bytes, size, opcode_arr, bytes_per_tx=16):
@@ -39,9 +41,19 @@ def gen_mergeable_umi_packets(num_bytes, size, opcode_arr, bytes_per_tx=16):
 
 def main():
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', action='store_true',
+                        help='Build with Verilator profiling and debug enabled')
+    parser.add_argument('--trace', action='store_true', help='Dump waveforms during simulation')
+    parser.add_argument('--threads', type=int, default=1, help='Number of Verilator simulation threads')
+    parser.add_argument('--hier', action='store_true',
+                        help='Verilate LUMI instances as hierarchical blocks')
+    args = parser.parse_args()
+
     multiprocessing.set_start_method('fork')
 
-    dut = SbDut('testbench', default_main=True, trace=True)
+    dut = SbDut('testbench', default_main=True, trace=args.trace,
+                threads=verilator_threads(args.threads))
 
     dut.use(lumi)
 
@@ -52,6 +64,8 @@ def main():
     dut.set('tool', 'verilator', 'task', 'compile', 'file', 'config', 'lumi/testbench/config.vlt',
             package='umi')
 
+    configure_verilator(dut, profile=args.profile, hier=args.hier)
+
     dut.build()
 
     # launch the simulation
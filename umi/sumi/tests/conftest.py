@@ -19,7 +19,7 @@ def build_dir(pytestconfig):
 
 
 @pytest.fixture
-def sumi_dut(build_dir, request):
+def sumi_dut(build_dir, sim_trace, request):
 
     extra_args = {
         '--vldmode': dict(type=int, default=1, help='Valid mode'),
@@ -27,7 +27,7 @@ def sumi_dut(build_dir, request):
     }
 
     dut = SbDut('testbench', cmdline=True, extra_args=extra_args,
-                default_main=True)
+                trace=sim_trace, default_main=True)
 
     dut.use(sumi)
 
@@ -45,8 +45,10 @@ def sumi_dut(build_dir, request):
             package='umi')
 
     # Build simulator
-    dut.set('option', 'builddir', build_dir / test_file_name)
-    with InterProcessLock(build_dir / f'{test_file_name}.lock'):
+    # traced and untraced simulators are built separately
+    build_name = f'{test_file_name}-trace' if sim_trace else test_file_name
+    dut.set('option', 'builddir', build_dir / build_name)
+    with InterProcessLock(build_dir / f'{build_name}.lock'):
         # ensure build only happens once
         # https://github.com/pytest-dev/pytest-xdist/blob/v3.6.1/docs/how-to.rst#making-session-scoped-fixtures-execute-only-once
         dut.build(fast=True)
@@ -18,7 +18,7 @@ def test_crossbar(sumi_dut, umi_send, sb_umi_valid_mode, sb_umi_ready_mode):
 
     # launch the simulation
     sumi_dut.simulate(
-            plusargs=['trace', ('PORTS', ports),
+            plusargs=[('PORTS', ports),
                       ('valid_mode', sb_umi_valid_mode),
                       ('ready_mode', sb_umi_ready_mode)])
 